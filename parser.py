@@ -1,40 +1,179 @@
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+import functools
+import mmap
+import os
+import pickle
+import sys
+import zipfile
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# Node type codes stored in Game.node_type
+CHANCE, PLAYER, LEAF = 0, 1, 2
+NODE_TYPES = ("chance", "player", "leaf")
+
+# Largest player id the int16 player columns can hold
+MAX_PLAYER = np.iinfo(np.int16).max
+
+# Turns "a=0.5 b=0.5" into "a 0.5 b 0.5" so a whole key=value tail splits in one pass
+EQ_TO_SPACE = bytes.maketrans(b'=', b' ')
 
 
-@dataclass
 class Node:
     """Represents a node in the game tree."""
-    path: str
-    node_type: str  # "chance", "player", or "leaf"
-    player: Optional[int] = None  # For player nodes
-    actions: List[str] = None  # For chance and player nodes
-    action_probs: Dict[str, float] = None  # For chance nodes
-    payoffs: Dict[int, float] = None  # For leaf nodes
+    __slots__ = ('path', 'node_type', 'player', 'actions', 'action_probs', 'payoffs')
 
-    def __post_init__(self):
-        if self.actions is None:
-            self.actions = []
-        if self.action_probs is None:
-            self.action_probs = {}
-        if self.payoffs is None:
-            self.payoffs = {}
+    def __init__(self, path: str, node_type: str, player: Optional[int], actions: Tuple[str, ...],
+                 action_probs: Dict[str, float], payoffs: Dict[int, float]):
+        self.path = path
+        self.node_type = node_type  # "chance", "player", or "leaf"
+        self.player = player  # For player nodes
+        self.actions = actions  # For chance and player nodes, a tuple of interned action names
+        self.action_probs = action_probs  # For chance nodes
+        self.payoffs = payoffs  # For leaf nodes
+
+    @classmethod
+    def make_chance(cls, path: str, actions: Tuple[str, ...], action_probs: Dict[str, float]) -> "Node":
+        return cls(path, "chance", None, actions, action_probs, {})
+
+    @classmethod
+    def make_leaf(cls, path: str, payoffs: Dict[int, float]) -> "Node":
+        return cls(path, "leaf", None, (), {}, payoffs)
+
+    @classmethod
+    def make_player(cls, path: str, player: int, actions: Tuple[str, ...]) -> "Node":
+        return cls(path, "player", player, actions, {}, {})
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"Node({fields})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Node):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
 
 
-@dataclass
 class Infoset:
     """Represents an information set."""
-    name: str
-    nodes: List[str]  # List of node paths in this infoset
+    __slots__ = ('name', 'nodes')
+
+    def __init__(self, name: str, nodes: List[str]):
+        self.name = name
+        self.nodes = nodes  # List of node paths in this infoset
+
+    def __repr__(self):
+        return f"Infoset(name={self.name!r}, nodes={self.nodes!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Infoset):
+            return NotImplemented
+        return self.name == other.name and self.nodes == other.nodes
+
+
+class PathInterner:
+    """Assigns dense integer ids to paths in the order they are first interned."""
+    __slots__ = ('paths', 'ids')
+
+    def __init__(self):
+        self.paths = []  # Maps from id to path
+        self.ids = {}  # Maps from path to id
+
+    def intern(self, path: str) -> int:
+        """Returns the id of path, assigning the next free id on first sight."""
+        i = self.ids.get(path)
+        if i is None:
+            i = self.ids[path] = len(self.paths)
+            self.paths.append(path)
+        return i
+
+    def get(self, path: str, default=None):
+        return self.ids.get(path, default)
+
+    def __getitem__(self, path: str) -> int:
+        return self.ids[path]
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.ids
+
+    def __len__(self):
+        return len(self.paths)
 
 
 class Game:
+    """
+    Game tree stored as struct of arrays: node i is described by node_type[i], player[i], and its slices of the pooled
+    action and payoff arrays. Node ids follow the top-down order of the EFG file.
+    """
+    # Attributes written to the cache by load_cached: numpy columns go to the .npz, name tables to the .pkl
+    CACHED_ARRAYS = ('order', 'node_type', 'player', 'first_action', 'n_actions', 'actions', 'action_probs',
+                     'first_payoff', 'n_payoffs', 'payoff_players', 'payoff_values',
+                     'infoset_node_begin', 'infoset_nodes', 'node_infoset_id')
+    CACHED_TABLES = ('players', 'action_names', 'infoset_names', 'infoset_to_id', 'unresolved_infosets')
+    # Part of the cache key; bump whenever the meaning or dtype of a cached attribute changes
+    CACHE_VERSION = 3
+
     def __init__(self, players=None):
         self.players = players or [] # List of players [P1, P2, P3, P4]
-        self.hist_to_infoset = {} # Maps from game tree nodes to infoset encoding
-        self.infosets = {} # Maps from infoset encoding to infoset object
-        self.order = [] # List of game tree nodes in top-down order
-        self.nodes = {} # Maps from node path to Node object
+        self.interner = PathInterner() # Maps between node paths and node ids
+        self.order = np.empty(0, dtype=np.int32) # Node ids in top-down order
+
+        self.node_type = np.empty(0, dtype=np.uint8) # CHANCE, PLAYER or LEAF per node
+        self.player = np.empty(0, dtype=np.int16) # Acting player per node, -1 if not a player node
+        self.first_action = np.empty(0, dtype=np.int32) # Offset of the node's actions in the action pool
+        self.n_actions = np.empty(0, dtype=np.int32) # Number of actions per node
+        self.actions = np.empty(0, dtype=np.int32) # Pooled action ids of all nodes
+        self.action_probs = np.empty(0, dtype=np.float64) # Chance probability per pooled action, nan at player nodes
+        self.action_names = [] # Maps from action id to interned action name
+        self.action_to_id = {} # Maps from action name to action id
+
+        self.first_payoff = np.empty(0, dtype=np.int32) # Offset of the node's payoffs in the payoff pool
+        self.n_payoffs = np.empty(0, dtype=np.int32) # Number of payoffs per node
+        self.payoff_players = np.empty(0, dtype=np.int16) # Pooled player of each payoff
+        self.payoff_values = np.empty(0, dtype=np.float64) # Pooled payoff values of all leaves
+
+        self.infoset_names = [] # Maps from infoset id to infoset encoding
+        self.infoset_to_id = {} # Maps from infoset encoding to infoset id
+        self.infoset_node_begin = np.zeros(1, dtype=np.int32) # Offset of each infoset's nodes in infoset_nodes
+        self.infoset_nodes = np.empty(0, dtype=np.int32) # Pooled node ids of all infosets
+        self.node_infoset_id = np.empty(0, dtype=np.int32) # Maps from node id to infoset id, -1 if none
+        self.unresolved_infosets = {} # Maps from infoset id to all its node paths, for infosets naming unknown nodes
+
+    @property
+    def paths(self):
+        return self.interner.paths # Maps from node id to node path
+
+    @property
+    def n_nodes(self):
+        return len(self.interner)
+
+    def get_node(self, path: str) -> Node:
+        """Builds a Node view of the node at path; meant for API edges, not for traversals."""
+        i = self.interner[path]
+        node_type = int(self.node_type[i])
+        begin = int(self.first_action[i])
+        action_ids = self.actions[begin:begin + int(self.n_actions[i])].tolist()
+        actions = tuple(self.action_names[a] for a in action_ids)
+
+        if node_type == CHANCE:
+            probs = self.action_probs[begin:begin + len(actions)].tolist()
+            return Node.make_chance(path, actions, dict(zip(actions, probs)))
+        if node_type == LEAF:
+            begin = int(self.first_payoff[i])
+            end = begin + int(self.n_payoffs[i])
+            payoffs = dict(zip(self.payoff_players[begin:end].tolist(), self.payoff_values[begin:end].tolist()))
+            return Node.make_leaf(path, payoffs)
+        return Node.make_player(path, int(self.player[i]), actions)
+
+    def get_infoset(self, name: str) -> Infoset:
+        """Builds an Infoset view of the infoset with the given encoding."""
+        i = self.infoset_to_id[name]
+        if i in self.unresolved_infosets:
+            return Infoset(name=name, nodes=list(self.unresolved_infosets[i]))
+        node_ids = self.infoset_nodes[self.infoset_node_begin[i]:self.infoset_node_begin[i + 1]].tolist()
+        return Infoset(name=name, nodes=[self.paths[n] for n in node_ids])
 
     def read_efg(self, path: str):
         """
@@ -49,125 +188,268 @@ class Game:
         Reads an extensive form game representation from leduc_tree.txt and populates the game object with the game tree nodes,
         the players, the infosets, and the order of the game tree nodes.
         """
-        players_set = set()
+        players_mask = 0  # bit p is set once player p has been seen
+        partition = bytes.partition  # cached to skip the attribute lookup per line
+
+        # Map the file and split it in one C call instead of iterating through the
+        # text I/O layer; lines stay as bytes and only stored substrings are decoded.
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                data = b''
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    data = mm[:]
+        lines = data.splitlines()
+
+        # The original parser read the file as UTF-8 text; validate once so the per-line decodes below cannot fail
+        if not data.isascii():
+            try:
+                data.decode('utf-8')
+            except UnicodeDecodeError as e:
+                line_num = data.count(b'\n', 0, e.start) + 1
+                raise ValueError(f"Line {line_num}: Invalid UTF-8 text: {e.reason}") from e
+
+        # Every node/infoset line contains its keyword, so these counts bound the number of rows
+        # and let the per-node columns be allocated once and filled by index
+        max_nodes = data.count(b'node ')
+        max_infosets = data.count(b'infoset ')
+
+        interner = PathInterner()
+        intern = interner.intern
+        action_names, action_to_id = [], {}
+
+        def action_id_of(action: str) -> int:
+            """Returns the id of action, interning the name and assigning the next free id on first sight."""
+            action_id = action_to_id.get(action)
+            if action_id is None:
+                action = sys.intern(action)
+                action_id = action_to_id[action] = len(action_names)
+                action_names.append(action)
+            return action_id
+
+        infoset_names, infoset_to_id = [None] * max_infosets, {}
+        infoset_paths = [None] * max_infosets # node paths per infoset, resolved to ids once all nodes are known
+        n_infosets = 0
+
+        # Per node columns, filled by node id and trimmed at the end
+        node_type = np.empty(max_nodes, dtype=np.uint8)
+        player = np.full(max_nodes, -1, dtype=np.int16)
+        first_action = np.empty(max_nodes, dtype=np.int32)
+        n_actions = np.zeros(max_nodes, dtype=np.int32)
+        first_payoff = np.empty(max_nodes, dtype=np.int32)
+        n_payoffs = np.zeros(max_nodes, dtype=np.int32)
+        # Pooled columns shared by all nodes, grown during the parse and frozen to numpy arrays at the end
+        actions = array('i')
+        action_probs = array('d')
+        payoff_players = array('h')
+        payoff_values = array('d')
+        nan = float('nan')
+
+        for line_num, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
 
-        with open(path, 'r') as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if not line:
-                    continue
+            # Dispatch on the first token; partition scans the line once. This measured faster than
+            # matching every line against one precompiled alternation regex, so keep it that way.
+            kind, _, rest = partition(line, b' ')
+
+            # Parse infoset lines
+            if kind == b"infoset":
+                infoset_name, sep, nodes_str = partition(rest, b" nodes ")
+                if not sep:
+                    raise ValueError(f"Line {line_num}: Invalid infoset format")
 
-                # Parse infoset lines
-                if line.startswith("infoset "):
-                    content = line[8:]  # Remove "infoset " prefix
-                    parts = content.split(" nodes ", 1)
-                    if len(parts) != 2:
-                        raise ValueError(f"Line {line_num}: Invalid infoset format")
-
-                    infoset_name = parts[0]
-                    node_paths = parts[1].split()
-
-                    # Create infoset object
-                    infoset = Infoset(name=infoset_name, nodes=node_paths)
-                    self.infosets[infoset_name] = infoset
-
-                    # Map each node to this infoset
-                    for node_path in node_paths:
-                        self.hist_to_infoset[node_path] = infoset_name
-
-                # Parse node lines
-                elif line.startswith("node "):
-                    content = line[5:]  # Remove "node " prefix
-
-                    # Split into path and rest
-                    parts = content.split(maxsplit=1)
-                    if len(parts) < 2:
-                        raise ValueError(f"Line {line_num}: Invalid format, expected path and node info")
-
-                    node_path = parts[0]
-                    rest = parts[1]
-
-                    # Add to order
-                    self.order.append(node_path)
-
-                    # Parse based on node type
-                    if rest.startswith("chance actions "):
-                        # Chance node
-                        actions_str = rest[15:]  # Skip "chance actions "
-                        action_probs = {}
-                        actions = []
-
-                        for action_prob in actions_str.split():
-                            if '=' not in action_prob:
-                                raise ValueError(f"Line {line_num}: Invalid action format: {action_prob}")
-                            action, prob_str = action_prob.split('=', 1)
-                            actions.append(action)
-                            action_probs[action] = float(prob_str)
-
-                        node = Node(
-                            path=node_path,
-                            node_type="chance",
-                            actions=actions,
-                            action_probs=action_probs
-                        )
-                        self.nodes[node_path] = node
-
-                    elif rest.startswith("leaf payoffs "):
-                        # Leaf node
-                        payoffs_str = rest[13:]  # Skip "leaf payoffs "
-                        payoffs = {}
-
-                        for player_payoff in payoffs_str.split():
-                            if '=' not in player_payoff:
-                                raise ValueError(f"Line {line_num}: Invalid payoff format: {player_payoff}")
-                            player_str, payoff_str = player_payoff.split('=', 1)
-                            player_num = int(player_str)
-                            payoffs[player_num] = float(payoff_str)
-                            players_set.add(player_num)
-
-                        node = Node(
-                            path=node_path,
-                            node_type="leaf",
-                            payoffs=payoffs
-                        )
-                        self.nodes[node_path] = node
-
-                    elif rest.startswith("player "):
-                        # Player node
-                        rest_parts = rest[7:].split(" actions ", 1)
-                        if len(rest_parts) != 2:
-                            raise ValueError(f"Line {line_num}: Invalid player node format")
-
-                        player_num = int(rest_parts[0])
-                        actions = rest_parts[1].split()
-
-                        players_set.add(player_num)
-
-                        node = Node(
-                            path=node_path,
-                            node_type="player",
-                            player=player_num,
-                            actions=actions
-                        )
-                        self.nodes[node_path] = node
-
-                    else:
-                        raise ValueError(f"Line {line_num}: Unknown node type in: {rest[:50]}")
+                infoset_name = infoset_name.decode('utf-8')
+                infoset_to_id[infoset_name] = n_infosets
+                infoset_names[n_infosets] = infoset_name
+                infoset_paths[n_infosets] = nodes_str.decode('utf-8').split()
+                n_infosets += 1
+
+            # Parse node lines
+            elif kind == b"node":
+                # Split into path and rest on any run of whitespace, as the original split(maxsplit=1) did
+                parts = rest.split(None, 1)
+                if len(parts) < 2:
+                    raise ValueError(f"Line {line_num}: Invalid format, expected path and node info")
+                node_path, rest = parts
+
+                node_path = node_path.decode('utf-8')
+
+                # Node ids follow the file order, so they double as the top-down order
+                n_seen = len(interner)
+                node_id = intern(node_path)
+                if node_id != n_seen:
+                    raise ValueError(f"Line {line_num}: Duplicate node {node_path}")
+                first_action[node_id] = len(actions)
+                first_payoff[node_id] = len(payoff_values)
+
+                # Parse based on node type: "chance actions ...", "leaf payoffs ..." or "player <n> actions ..."
+                node_kind, _, payload = partition(rest, b' ')
+
+                if node_kind == b"chance":
+                    # Chance node
+                    keyword, _, actions_str = partition(payload, b' ')
+                    if keyword != b"actions":
+                        raise ValueError(f"Line {line_num}: Unknown node type in: {rest[:50].decode('utf-8', 'replace')}")
+
+                    # Decode the tail once; keys and probabilities alternate after the translate
+                    tokens = actions_str.translate(EQ_TO_SPACE).decode('utf-8').split()
+                    if len(tokens) != 2 * actions_str.count(b'='):
+                        raise ValueError(f"Line {line_num}: Invalid action format in: {actions_str[:50].decode('utf-8', 'replace')}")
+                    actions.extend(map(action_id_of, tokens[::2]))
+                    action_probs.extend(map(float, tokens[1::2]))
+
+                    node_type[node_id] = CHANCE
+                    n_actions[node_id] = len(tokens) // 2
+
+                elif node_kind == b"leaf":
+                    # Leaf node
+                    keyword, _, payoffs_str = partition(payload, b' ')
+                    if keyword != b"payoffs":
+                        raise ValueError(f"Line {line_num}: Unknown node type in: {rest[:50].decode('utf-8', 'replace')}")
+
+                    tokens = payoffs_str.split()
+                    for player_payoff in tokens:
+                        player_str, sep, payoff_str = partition(player_payoff, b'=')
+                        if not sep:
+                            raise ValueError(f"Line {line_num}: Invalid payoff format: {player_payoff.decode('utf-8', 'replace')}")
+                        player_num = int(player_str)
+                        if not 0 <= player_num <= MAX_PLAYER:
+                            raise ValueError(f"Line {line_num}: Invalid player {player_num}, player ids must be between 0 and {MAX_PLAYER}")
+                        payoff_players.append(player_num)
+                        payoff_values.append(float(payoff_str))
+                        players_mask |= 1 << player_num
+
+                    node_type[node_id] = LEAF
+                    n_payoffs[node_id] = len(tokens)
+
+                elif node_kind == b"player":
+                    # Player node
+                    player_str, sep, actions_str = partition(payload, b" actions ")
+                    if not sep:
+                        raise ValueError(f"Line {line_num}: Invalid player node format")
+
+                    player_num = int(player_str)
+                    if not 0 <= player_num <= MAX_PLAYER:
+                        raise ValueError(f"Line {line_num}: Invalid player {player_num}, player ids must be between 0 and {MAX_PLAYER}")
+                    tokens = actions_str.decode('utf-8').split()
+                    actions.extend(map(action_id_of, tokens))
+                    action_probs.extend([nan] * len(tokens))
+
+                    players_mask |= 1 << player_num
+
+                    node_type[node_id] = PLAYER
+                    player[node_id] = player_num
+                    n_actions[node_id] = len(tokens)
 
                 else:
-                    raise ValueError(f"Line {line_num}: Expected line to start with 'node ' or 'infoset ', got: {line[:50]}")
+                    raise ValueError(f"Line {line_num}: Unknown node type in: {rest[:50].decode('utf-8', 'replace')}")
+
+            else:
+                raise ValueError(f"Line {line_num}: Expected line to start with 'node ' or 'infoset ', got: {line[:50].decode('utf-8', 'replace')}")
+
+        n_nodes = len(interner)
+        del infoset_names[n_infosets:], infoset_paths[n_infosets:]
+
+        # Resolve infoset members now that every node has an id
+        node_infoset_id = np.full(n_nodes, -1, dtype=np.int32)
+        infoset_node_begin = [0]
+        infoset_nodes = []
+        unresolved_infosets = {}
+        for infoset_id, node_paths in enumerate(infoset_paths):
+            for node_path in node_paths:
+                node_id = interner.get(node_path)
+                if node_id is None:
+                    # The original parser kept paths without a node line in Infoset.nodes, so keep them aside
+                    unresolved_infosets[infoset_id] = node_paths
+                    continue
+                infoset_nodes.append(node_id)
+                node_infoset_id[node_id] = infoset_id
+            infoset_node_begin.append(len(infoset_nodes))
+
+        self.interner = interner
+        self.order = np.arange(n_nodes, dtype=np.int32)
+        self.node_type = node_type[:n_nodes]
+        self.player = player[:n_nodes]
+        self.first_action = first_action[:n_nodes]
+        self.n_actions = n_actions[:n_nodes]
+        self.actions = np.asarray(actions, dtype=np.int32)
+        self.action_probs = np.asarray(action_probs, dtype=np.float64)
+        self.action_names, self.action_to_id = action_names, action_to_id
+        self.first_payoff = first_payoff[:n_nodes]
+        self.n_payoffs = n_payoffs[:n_nodes]
+        self.payoff_players = np.asarray(payoff_players, dtype=np.int16)
+        self.payoff_values = np.asarray(payoff_values, dtype=np.float64)
+        self.infoset_names, self.infoset_to_id = infoset_names, infoset_to_id
+        self.infoset_node_begin = np.asarray(infoset_node_begin, dtype=np.int32)
+        self.infoset_nodes = np.asarray(infoset_nodes, dtype=np.int32)
+        self.node_infoset_id = node_infoset_id
+        self.unresolved_infosets = unresolved_infosets
 
         # Set players list (sorted)
-        self.players = sorted(list(players_set))
-
-leduc = Game()
-leduc.read_efg("leduc_tree.txt")
-print(leduc.players)
-key = list(leduc.nodes.keys())[100]
-print(key, leduc.nodes[key])
-print(len(leduc.infosets))
-# print(leduc.hist_to_infoset)
-# print(leduc.order)
+        self.players = [p for p in range(players_mask.bit_length()) if players_mask >> p & 1]
+
+    @classmethod
+    def load_cached(cls, path: str) -> "Game":
+        """
+        Returns the game in the EFG file at path, reusing the cache next to it (path + '.npz' and path + '.pkl') if it
+        was written by this CACHE_VERSION for the file's current size and mtime, and parsing the file and rewriting
+        the cache otherwise.
+        """
+        stat = os.stat(path)
+        key = (cls.CACHE_VERSION, stat.st_size, stat.st_mtime_ns)
+        game = cls()
+
+        try:
+            with open(path + '.pkl', 'rb') as f:
+                tables = pickle.load(f)
+            if isinstance(tables, dict) and tables.pop('key', None) == key:
+                with np.load(path + '.npz') as arrays:
+                    for name in cls.CACHED_ARRAYS:
+                        setattr(game, name, arrays[name])
+                for name in cls.CACHED_TABLES:
+                    setattr(game, name, tables[name])
+                game.interner.paths, game.interner.ids = tables['paths'], tables['path_ids']
+                # Unpickled strings are fresh objects, so intern the action names again
+                game.action_names = [sys.intern(action) for action in game.action_names]
+                game.action_to_id = {action: i for i, action in enumerate(game.action_names)}
+                return game
+        except (OSError, EOFError, KeyError, ValueError, pickle.UnpicklingError, zipfile.BadZipFile):
+            pass # missing, stale or unreadable cache, parse the file instead
+
+        game.read_efg(path)
+        try:
+            # The .pkl holds the validity key, so it is dropped first and written last and a partial write never
+            # looks valid
+            if os.path.exists(path + '.pkl'):
+                os.remove(path + '.pkl')
+            np.savez(path + '.npz', **{name: getattr(game, name) for name in cls.CACHED_ARRAYS})
+            tables = {name: getattr(game, name) for name in cls.CACHED_TABLES}
+            # Only builtin containers are pickled, so the cache loads no matter which module name wrote it
+            tables['paths'], tables['path_ids'] = game.interner.paths, game.interner.ids
+            tables['key'] = key
+            with open(path + '.pkl', 'wb') as f:
+                pickle.dump(tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            pass # the cache is only an optimization, e.g. the directory may be read only
+        return game
+
+
+@functools.lru_cache(maxsize=None)
+def load_game(path: str) -> Game:
+    """Loads the EFG file at path once per process and returns the shared Game."""
+    return Game.load_cached(path)
+
+
+if __name__ == "__main__":
+    leduc = load_game("leduc_tree.txt")
+    print(leduc.players)
+    key = leduc.paths[100]
+    print(key, leduc.get_node(key))
+    print(len(leduc.infoset_names))
+    # print(leduc.node_infoset_id)
+    # print(leduc.order)
 
 
 
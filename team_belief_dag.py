@@ -1,74 +1,225 @@
+from typing import NamedTuple
+
+import numpy as np
+
 import parser
+from parser import load_game
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError: # numba is optional, the kernels below then run as plain python
+    HAVE_NUMBA = False
 
-leduc = Game()
-leduc.read_efg("leduc_tree.txt") #stores the extensive form game tree of leduc
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
 
 class TeamBeliefDag:
     def __init__(self, game, team_players):
         self.game = game
         self.team_players = team_players
-        self.active_nodes = []
+        self.active_nodes = [] # active node ids (non-negative ints) in top-down order
         self.inactive_nodes = []
-        self.child_of = {} # map from node, action : child node
-        self.parent_of = {} # map from node : parent node
-
-
-    def efg_to_tbdag(game, team_players):
+        self.child_of = {} # map from node id : {action : child node id}
+        self.parent_of = {} # map from node id : list of parent node ids
+        self.root = None # root node id of the dag
+
+        # Frozen topology, built once by freeze() and shared by every regret minimization step
+        self.frozen = False
+        self.n_nodes = 0
+        self.edges = [] # edge id : (node id, action)
+        self.edge_id = {} # (node id, action) : edge id
+        self.edge_child = None # edge id : child node id
+        self.node_edge_begin = None # CSR offsets of each node's edges, length n_nodes + 1
+        self.parents_csr = None # pooled parent node ids
+        self.parents_begin = None # CSR offsets of each node's parents in parents_csr, length n_nodes + 1
+        self.active_order_np = None # active node ids in top-down order
+
+
+    def efg_to_tbdag(self):
         """
         Converts the extensive form in leduc to its equivalent team belief representation for team {team_players[0], team_players[1]} 
         """
 
         pass
 
+    def freeze(self):
+        """
+        Lays the dag out in CSR arrays indexed by node id and (node, action) edge id. The topology does not change
+        between regret minimization steps, so this runs once and is skipped on later calls.
+        """
+        if self.frozen:
+            return
+        if not self.active_nodes and self.root is None:
+            raise ValueError("Cannot freeze a dag without active nodes or a root")
+
+        # Size the arrays by the largest id in use, so every node gets a row
+        node_ids = [*self.active_nodes, *self.inactive_nodes, *self.child_of, *self.parent_of]
+        node_ids.extend(child for children in self.child_of.values() for child in children.values())
+        node_ids.extend(parent for parents in self.parent_of.values() for parent in parents)
+        if self.root is not None:
+            node_ids.append(self.root)
+        if min(node_ids) < 0:
+            raise ValueError(f"Dag node ids must be non-negative, got {min(node_ids)}")
+        self.n_nodes = max(node_ids) + 1
+
+        edge_child = []
+        node_edge_begin = [0]
+        parents_csr = []
+        parents_begin = [0]
+        for node in range(self.n_nodes):
+            for action, child in self.child_of.get(node, {}).items():
+                self.edges.append((node, action))
+                edge_child.append(child)
+            node_edge_begin.append(len(self.edges))
+            parents_csr.extend(self.parent_of.get(node, ()))
+            parents_begin.append(len(parents_csr))
+        self.edge_id = {edge: i for i, edge in enumerate(self.edges)}
+
+        self.edge_child = np.asarray(edge_child, dtype=np.int32)
+        self.node_edge_begin = np.asarray(node_edge_begin, dtype=np.int32)
+        self.parents_csr = np.asarray(parents_csr, dtype=np.int32)
+        self.parents_begin = np.asarray(parents_begin, dtype=np.int32)
+        self.active_order_np = np.asarray(self.active_nodes, dtype=np.int32)
+        if self.root is None:
+            self.root = self.active_nodes[0]
+        self.frozen = True
+
+class HeightLayer(NamedTuple):
+    """Active nodes of equal height and the flattened edges and parents observe_utility needs for them."""
+    nodes: np.ndarray # active node ids in the layer
+    edges: np.ndarray # edge ids of those nodes, grouped by node
+    has_edges: np.ndarray # per node, whether it owns at least one edge
+    segment_begin: np.ndarray # offset in edges of each node that has edges, for np.add.reduceat
+    segment_size: np.ndarray # number of edges of each node that has edges
+    parents: np.ndarray # parent node ids of the layer's nodes, grouped by node
+    n_parents: np.ndarray # number of parents per node
+
 class DagRegMin:
 
     def __init__(self, dag):
         self.dag = dag # tbdag representation of game
-        self.regret = {} # map from active nodes s : {action (at s) : regret}
-        self.x = {}
-        self.x_prime = {} # unscaled probabilities
+        dag.freeze()
+        self.regret = np.zeros(len(dag.edges)) # regret[e] for edge e = (active node s, action at s)
+        self.x = np.zeros(len(dag.edges))
+        self.x_prime = np.zeros(len(dag.edges)) # unscaled probabilities
+        self.reach = np.zeros(dag.n_nodes)
+        self.u = np.zeros(dag.n_nodes)
+
+        # Segments of the nodes that have edges, for reducing per-edge values to one value per node
+        n_node_edges = np.diff(dag.node_edge_begin)
+        self.segment_begin = dag.node_edge_begin[:-1][n_node_edges > 0]
+        self.segment_size = n_node_edges[n_node_edges > 0]
+        self.uniform = np.repeat(1.0 / self.segment_size, self.segment_size) # uniform x_prime per edge
+        self.layers = self._height_layers()
+
+    def _height_layers(self):
+        """
+        Groups the active nodes by height above the bottom of the dag. Nodes of equal height never depend on each
+        other, so observe_utility can process a whole layer with vectorized numpy calls, lowest layer first.
+        """
+        dag = self.dag
+        height = np.zeros(dag.n_nodes, dtype=np.int64)
+        for s in dag.active_order_np[::-1]:
+            children = dag.edge_child[dag.node_edge_begin[s]:dag.node_edge_begin[s + 1]]
+            if len(children):
+                height[s] = max(height[s], height[children].max())
+            for parent in dag.parents_csr[dag.parents_begin[s]:dag.parents_begin[s + 1]]:
+                height[parent] = max(height[parent], height[s] + 1)
+
+        layers = []
+        active_height = height[dag.active_order_np]
+        for h in np.unique(active_height):
+            nodes = dag.active_order_np[active_height == h]
+            begin, end = dag.node_edge_begin[nodes], dag.node_edge_begin[nodes + 1]
+            edges = np.concatenate([np.arange(b, e) for b, e in zip(begin, end)]).astype(np.int32)
+            n_node_edges = end - begin
+            has_edges = n_node_edges > 0
+            segment_size = n_node_edges[has_edges]
+            segment_begin = np.concatenate(([0], np.cumsum(segment_size)[:-1])).astype(np.int32)
+            p_begin, p_end = dag.parents_begin[nodes], dag.parents_begin[nodes + 1]
+            parents = np.concatenate([dag.parents_csr[b:e] for b, e in zip(p_begin, p_end)]).astype(np.int32)
+            layers.append(HeightLayer(nodes, edges, has_edges, segment_begin, segment_size, parents, p_end - p_begin))
+        return layers
 
     def next_strategy(self):
-        reach = {}
-        for node in self.dag.nodes:
-            reach[node], self.x_prime[node] = {}, {}
-            for action in self.dag.child_of[node]:
-                reach[node] = 1
-                self.x_prime[node][action] = 1
-        
-        for node in self.dag.active_nodes:
-            if node != self.dag.root:
-                reach[node] = sum(reach[parent] for parent in self.dag.parent_of[node])
-
-            S = sum(max(self.regret[node][action], 0) for action in self.dag.child_of[node])
-
-            for action in self.dag.child_of[node]:
-                if S == 0:
-                    self.x_prime[node][action] = 1 / len(self.dag.child_of[node])
-
-                else:
-                    self.x_prime[node][action] = max(self.regret[node][action] - S, 0) / S
-
-                self.x[(node, action)] = self.x_prime[node][action] * reach[node]
-                
-
+        """
+        Returns the sequence form strategy as an array indexed by edge id (see dag.edges).
+        """
+        dag = self.dag
+        # Regret matching needs no ordering, so all nodes are handled in one vectorized pass
+        if len(dag.edges):
+            positive = np.maximum(self.regret, 0.0)
+            S = np.repeat(np.add.reduceat(positive, self.segment_begin), self.segment_size)
+            np.copyto(self.x_prime, self.uniform)
+            np.divide(positive, S, out=self.x_prime, where=S > 0)
+
+        _next_strategy(self.x, self.x_prime, self.reach, dag.root, dag.active_order_np,
+                       dag.node_edge_begin, dag.edge_child, dag.parents_begin, dag.parents_csr)
         return self.x
 
     def observe_utility(self, gradient):
-        u = {}
-        for node in self.dag.nodes:
-            if node.node_type != "terminal":
-                u[node] = 0
-
-        for node in self.dag.active_nodes:
-            u[node] += sum(u[(node,action)] * self.x_prime[(node,action)] for action in self.dag.child_of[node])
-            for action in self.dag.child_of[node]:
-                self.regret[node][action] += u[node] - u[(node,action)]
-
-            for parent in self.dag.parent_of[node]:
-                u[parent] += u[node]
-
-    
-
-            
-
+        """
+        Accumulates regrets for an array of gradient values indexed by edge id (see dag.edges).
+        """
+        dag = self.dag
+        gradient = np.asarray(gradient, dtype=np.float64)
+        if gradient.shape != (len(dag.edges),):
+            raise ValueError(f"Expected a gradient of shape ({len(dag.edges)},), got {gradient.shape}")
+        if HAVE_NUMBA:
+            _observe_utility(self.regret, self.x_prime, gradient, self.u, dag.active_order_np,
+                             dag.node_edge_begin, dag.edge_child, dag.parents_begin, dag.parents_csr)
+            return
+
+        # Without numba the per-node loop would run in the interpreter, so vectorize it one height layer at a time
+        u = self.u
+        u[:] = 0.0
+        for layer in self.layers:
+            nodes, edges = layer.nodes, layer.edges
+            if len(edges):
+                u_edge = gradient[edges] + u[dag.edge_child[edges]]
+                value = np.zeros(len(nodes))
+                value[layer.has_edges] = np.add.reduceat(u_edge * self.x_prime[edges], layer.segment_begin)
+                u[nodes] += value
+                self.regret[edges] += np.repeat(u[nodes][layer.has_edges], layer.segment_size) - u_edge
+            np.add.at(u, layer.parents, np.repeat(u[nodes], layer.n_parents))
+
+
+@njit(cache=True)
+def _next_strategy(x, x_prime, reach, root, active_order, node_edge_begin, edge_child, parent_begin, parents):
+    reach[:] = 0.0
+    reach[root] = 1.0
+
+    for s in active_order:
+        if s != root:
+            total = 0.0
+            for k in range(parent_begin[s], parent_begin[s + 1]):
+                total += reach[parents[k]]
+            reach[s] = total
+
+        for e in range(node_edge_begin[s], node_edge_begin[s + 1]):
+            x[e] = x_prime[e] * reach[s]
+            reach[edge_child[e]] += x[e]
+
+
+@njit(cache=True)
+def _observe_utility(regret, x_prime, gradient, u, active_order, node_edge_begin, edge_child, parent_begin, parents):
+    u[:] = 0.0
+
+    # bottom-up, so every child's utility is complete before its parents read it
+    for i in range(len(active_order) - 1, -1, -1):
+        s = active_order[i]
+        begin, end = node_edge_begin[s], node_edge_begin[s + 1]
+        for e in range(begin, end):
+            u[s] += (gradient[e] + u[edge_child[e]]) * x_prime[e]
+        for e in range(begin, end):
+            regret[e] += u[s] - (gradient[e] + u[edge_child[e]])
+
+        for k in range(parent_begin[s], parent_begin[s + 1]):
+            u[parents[k]] += u[s]
+
+
+if __name__ == "__main__":
+    leduc = load_game("leduc_tree.txt") #stores the extensive form game tree of leduc
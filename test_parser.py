@@ -0,0 +1,221 @@
+import math
+import os
+import pickle
+import sys
+
+import numpy as np
+import pytest
+
+from parser import CHANCE, LEAF, MAX_PLAYER, PLAYER, Game, Infoset, Node
+
+
+def read(tmp_path, text):
+    path = tmp_path / "game.txt"
+    if isinstance(text, bytes):
+        path.write_bytes(text)
+    else:
+        path.write_text(text, encoding="utf-8")
+    game = Game()
+    game.read_efg(str(path))
+    return game
+
+
+SMALL_GAME = """\
+node / chance actions J=0.5 Q=0.5
+node /C:J player 1 actions call fold
+node /C:J/P1:call leaf payoffs 1=1 2=-1
+node /C:J/P1:fold leaf payoffs 1=-1 2=1
+node /C:Q player 1 actions call fold
+node /C:Q/P1:call player 2 actions call
+node /C:Q/P1:call/P2:call leaf payoffs 1=-2 2=2
+node /C:Q/P1:fold leaf payoffs 1=-1 2=1
+infoset pl1:? nodes /C:J /C:Q
+infoset pl2:? nodes /C:Q/P1:call
+"""
+
+
+def test_small_game_views(tmp_path):
+    game = read(tmp_path, SMALL_GAME)
+
+    assert game.players == [1, 2]
+    assert game.n_nodes == 8
+    assert game.paths[:3] == ["/", "/C:J", "/C:J/P1:call"]
+    assert game.order.tolist() == list(range(8))
+    assert game.node_type.tolist() == [CHANCE, PLAYER, LEAF, LEAF, PLAYER, PLAYER, LEAF, LEAF]
+
+    assert game.get_node("/") == Node.make_chance("/", ("J", "Q"), {"J": 0.5, "Q": 0.5})
+    assert game.get_node("/C:Q") == Node.make_player("/C:Q", 1, ("call", "fold"))
+    assert game.get_node("/C:Q/P1:call") == Node.make_player("/C:Q/P1:call", 2, ("call",))
+    assert game.get_node("/C:J/P1:call") == Node.make_leaf("/C:J/P1:call", {1: 1.0, 2: -1.0})
+    # Player nodes share one action id per name
+    assert game.get_node("/C:J").actions[0] is game.get_node("/C:Q/P1:call").actions[0]
+    assert math.isnan(game.action_probs[game.first_action[1]])
+
+    assert game.infoset_names == ["pl1:?", "pl2:?"]
+    assert game.get_infoset("pl1:?") == Infoset(name="pl1:?", nodes=["/C:J", "/C:Q"])
+    assert game.get_infoset("pl2:?") == Infoset(name="pl2:?", nodes=["/C:Q/P1:call"])
+    assert game.node_infoset_id.tolist() == [-1, 0, -1, -1, 0, 1, -1, -1]
+
+
+def test_whitespace_and_blank_lines_are_tolerated(tmp_path):
+    game = read(tmp_path, "\n  node /\tplayer 1 actions  a   b \r\n\nnode /P1:a  leaf payoffs 1=1\n")
+
+    assert game.get_node("/") == Node.make_player("/", 1, ("a", "b"))
+    assert game.get_node("/P1:a") == Node.make_leaf("/P1:a", {1: 1.0})
+
+
+def test_utf8_names(tmp_path):
+    game = read(tmp_path, "node / player 0 actions ä\nnode /P0:ä leaf payoffs 0=1\ninfoset pl0:é nodes /\n")
+
+    assert game.get_node("/").actions == ("ä",)
+    assert game.get_node("/P0:ä") == Node.make_leaf("/P0:ä", {0: 1.0})
+    assert game.get_infoset("pl0:é").nodes == ["/"]
+
+
+def test_empty_file(tmp_path):
+    game = read(tmp_path, "")
+
+    assert game.n_nodes == 0
+    assert game.players == []
+    assert game.infoset_names == []
+
+
+@pytest.mark.parametrize("text", [
+    "node / leaf payoffs 1=1 2=3\nnode / player 1 actions a b\n",
+    "node / player 1 actions a b\nnode /P1:a leaf payoffs 1=1\nnode / leaf payoffs 1=2\n",
+])
+def test_duplicate_node_is_rejected(tmp_path, text):
+    with pytest.raises(ValueError, match="Line [23]: Duplicate node /"):
+        read(tmp_path, text)
+
+
+def test_infoset_keeps_paths_without_a_node(tmp_path):
+    game = read(tmp_path, "infoset pl1:? nodes / /P1:a /missing\nnode / player 1 actions a\nnode /P1:a leaf payoffs 1=0\n")
+
+    assert game.get_infoset("pl1:?").nodes == ["/", "/P1:a", "/missing"]
+    assert game.node_infoset_id.tolist() == [0, 0]
+
+
+@pytest.mark.parametrize("text, message", [
+    (b"node / leaf payoffs 1=1\nnode /\xff leaf payoffs 1=1\n", "Line 2: Invalid UTF-8 text"),
+    ("node / leaf payoffs -1=1\n", "Line 1: Invalid player -1"),
+    (f"node / leaf payoffs {MAX_PLAYER + 1}=1\n", f"Line 1: Invalid player {MAX_PLAYER + 1}"),
+    ("node / player -1 actions a\n", "Line 1: Invalid player -1"),
+    (f"node / player {MAX_PLAYER + 1} actions a\n", f"Line 1: Invalid player {MAX_PLAYER + 1}"),
+    ("infoset pl1:? /\n", "Line 1: Invalid infoset format"),
+    ("node /\n", "Line 1: Invalid format, expected path and node info"),
+    ("node / root actions a\n", "Line 1: Unknown node type"),
+    ("node / chance payoffs a=1\n", "Line 1: Unknown node type"),
+    ("node / leaf actions a\n", "Line 1: Unknown node type"),
+    ("node / chance actions a=0.5 b\n", "Line 1: Invalid action format"),
+    ("node / leaf payoffs 1=1 2\n", "Line 1: Invalid payoff format: 2"),
+    ("node / player 1 a b\n", "Line 1: Invalid player node format"),
+    ("node / leaf payoffs 1=1\nedge / /P1:a\n", "Line 2: Expected line to start with 'node ' or 'infoset '"),
+])
+def test_malformed_lines_are_rejected(tmp_path, text, message):
+    with pytest.raises(ValueError, match=message):
+        read(tmp_path, text)
+
+
+def write_game(tmp_path, text):
+    path = tmp_path / "cached.txt"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def count_parses(monkeypatch):
+    """Counts the calls to Game.read_efg, so tests can tell a cache hit from a parse."""
+    calls = []
+    read_efg = Game.read_efg
+
+    def counting_read_efg(game, path):
+        calls.append(path)
+        read_efg(game, path)
+
+    monkeypatch.setattr(Game, "read_efg", counting_read_efg)
+    return calls
+
+
+def assert_same_game(game, expected):
+    for name in Game.CACHED_ARRAYS:
+        np.testing.assert_array_equal(getattr(game, name), getattr(expected, name), err_msg=name)
+        assert getattr(game, name).dtype == getattr(expected, name).dtype, name
+    for name in Game.CACHED_TABLES:
+        assert getattr(game, name) == getattr(expected, name), name
+    assert game.paths == expected.paths
+    assert game.action_to_id == expected.action_to_id
+    for path in expected.paths:
+        assert game.get_node(path) == expected.get_node(path)
+
+
+def test_load_cached_warm_load_matches_parse(tmp_path, monkeypatch):
+    path = write_game(tmp_path, SMALL_GAME)
+    expected = read(tmp_path, SMALL_GAME)
+    parses = count_parses(monkeypatch)
+
+    cold = Game.load_cached(path)
+    assert os.path.exists(path + ".npz") and os.path.exists(path + ".pkl")
+    warm = Game.load_cached(path)
+
+    assert len(parses) == 1
+    assert_same_game(warm, expected)
+    assert_same_game(warm, cold)
+    # Unpickled action names are interned again, so they are the same objects as interned literals
+    assert all(action is sys.intern(action) for action in warm.action_names)
+
+
+def test_load_cached_reparses_changed_source(tmp_path, monkeypatch):
+    path = write_game(tmp_path, SMALL_GAME)
+    Game.load_cached(path)
+    mtime_ns = os.stat(path).st_mtime_ns
+    changed = SMALL_GAME.replace("1=1 2=-1", "1=3 2=-3")
+    write_game(tmp_path, changed)
+    os.utime(path, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+    parses = count_parses(monkeypatch)
+
+    game = Game.load_cached(path)
+    assert len(parses) == 1
+    assert game.get_node("/C:J/P1:call").payoffs == {1: 3.0, 2: -3.0}
+    assert_same_game(Game.load_cached(path), game)
+    assert len(parses) == 1
+
+
+def test_load_cached_reparses_after_version_bump(tmp_path, monkeypatch):
+    path = write_game(tmp_path, SMALL_GAME)
+    Game.load_cached(path)
+    monkeypatch.setattr(Game, "CACHE_VERSION", Game.CACHE_VERSION + 1)
+    parses = count_parses(monkeypatch)
+
+    Game.load_cached(path)
+    assert len(parses) == 1
+    with open(path + ".pkl", "rb") as f:
+        assert pickle.load(f)["key"][0] == Game.CACHE_VERSION
+    Game.load_cached(path)
+    assert len(parses) == 1
+
+
+@pytest.mark.parametrize("suffix, contents", [
+    (".pkl", b"not a pickle"),
+    (".pkl", b""),
+    (".pkl", pickle.dumps(["not", "a", "dict"])),
+    (".npz", b"PK\x03\x04 truncated"),
+])
+def test_load_cached_recovers_from_corrupt_cache(tmp_path, monkeypatch, suffix, contents):
+    path = write_game(tmp_path, SMALL_GAME)
+    Game.load_cached(path)
+    with open(path + suffix, "wb") as f:
+        f.write(contents)
+    expected = read(tmp_path, SMALL_GAME)
+    parses = count_parses(monkeypatch)
+
+    assert_same_game(Game.load_cached(path), expected)
+    assert len(parses) == 1
+    assert_same_game(Game.load_cached(path), expected)
+    assert len(parses) == 1
+
+
+def test_load_cached_keeps_unresolved_infosets(tmp_path):
+    path = write_game(tmp_path, SMALL_GAME + "infoset pl2:! nodes /C:J/P1:call /missing\n")
+    Game.load_cached(path)
+
+    assert Game.load_cached(path).get_infoset("pl2:!").nodes == ["/C:J/P1:call", "/missing"]
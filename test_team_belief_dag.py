@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+import team_belief_dag
+from team_belief_dag import DagRegMin, TeamBeliefDag
+
+
+def small_dag():
+    """
+    Two decision levels: root 0 plays a -> observation 1 -> node 3 (c, d) or b -> observation 2 -> node 4 (e, f).
+    Nodes 5 to 8 are terminal observations.
+    """
+    dag = TeamBeliefDag(None, [0, 1])
+    dag.active_nodes = [0, 3, 4]
+    dag.inactive_nodes = [1, 2, 5, 6, 7, 8]
+    dag.child_of = {0: {"a": 1, "b": 2}, 3: {"c": 5, "d": 6}, 4: {"e": 7, "f": 8}}
+    dag.parent_of = {1: [0], 2: [0], 3: [1], 4: [2], 5: [3], 6: [3], 7: [4], 8: [4]}
+    dag.root = 0
+    return dag
+
+
+def edge_values(dag, values):
+    return {edge: values[dag.edge_id[edge]] for edge in dag.edges}
+
+
+def gradient_for(dag, values):
+    gradient = np.zeros(len(dag.edges))
+    for edge, value in values.items():
+        gradient[dag.edge_id[edge]] = value
+    return gradient
+
+
+def test_next_strategy_starts_uniform():
+    dag = small_dag()
+    x = edge_values(dag, DagRegMin(dag).next_strategy())
+
+    assert x[(0, "a")] + x[(0, "b")] == pytest.approx(1.0)
+    assert x[(0, "a")] == pytest.approx(0.5)
+    # node 3 is only reached through a, so its reach is x[a] and it splits that mass evenly
+    assert x[(3, "c")] == pytest.approx(0.25)
+    assert x[(3, "d")] == pytest.approx(0.25)
+    assert x[(4, "e")] + x[(4, "f")] == pytest.approx(x[(0, "b")])
+
+
+def test_observe_utility_updates_regrets():
+    dag = small_dag()
+    regmin = DagRegMin(dag)
+    regmin.next_strategy()
+    regmin.observe_utility(gradient_for(dag, {(3, "c"): 1.0, (3, "d"): 3.0, (4, "e"): 2.0, (4, "f"): 4.0}))
+
+    # u[3] = 2 and u[4] = 3 under the uniform strategy, so the root sees a = 2, b = 3 and u[0] = 2.5
+    regret = edge_values(dag, regmin.regret)
+    assert regret[(3, "c")] == pytest.approx(1.0)
+    assert regret[(3, "d")] == pytest.approx(-1.0)
+    assert regret[(4, "e")] == pytest.approx(1.0)
+    assert regret[(4, "f")] == pytest.approx(-1.0)
+    assert regret[(0, "a")] == pytest.approx(0.5)
+    assert regret[(0, "b")] == pytest.approx(-0.5)
+
+    x = edge_values(dag, regmin.next_strategy())
+    assert x[(0, "a")] == pytest.approx(1.0)
+    assert x[(0, "b")] == pytest.approx(0.0)
+    assert x[(3, "c")] == pytest.approx(1.0)
+    assert x[(3, "d")] == pytest.approx(0.0)
+    assert x[(4, "e")] == pytest.approx(0.0)
+
+
+@pytest.mark.parametrize("have_numba", [True, False])
+@pytest.mark.parametrize("shape", [(2,), (7,), (6, 1)])
+def test_observe_utility_rejects_wrong_gradient_shape(monkeypatch, have_numba, shape):
+    monkeypatch.setattr(team_belief_dag, "HAVE_NUMBA", have_numba)
+    regmin = DagRegMin(small_dag())
+    regmin.next_strategy()
+    with pytest.raises(ValueError, match="gradient of shape"):
+        regmin.observe_utility(np.ones(shape))
+    np.testing.assert_array_equal(regmin.regret, 0.0)
+
+
+def random_merging_dag(seed):
+    """Layered dag where active nodes below the root can have several observation parents."""
+    rng = np.random.default_rng(seed)
+    dag = TeamBeliefDag(None, [0, 1])
+    next_id = iter(range(10_000))
+    layers = [[next(next_id)]] + [[next(next_id) for _ in range(rng.integers(2, 6))] for _ in range(3)]
+    for layer in layers:
+        for node in layer:
+            dag.active_nodes.append(node)
+            dag.child_of[node] = {}
+            for action in range(rng.integers(1, 4)):
+                observation = next(next_id)
+                dag.child_of[node][action] = observation
+                dag.inactive_nodes.append(observation)
+                dag.parent_of[observation] = [node]
+    for layer, below in zip(layers, layers[1:]):
+        observations = [o for node in layer for o in dag.child_of[node].values()]
+        for node in below:
+            count = rng.integers(1, min(3, len(observations)) + 1)
+            dag.parent_of[node] = rng.choice(observations, size=count, replace=False).tolist()
+    dag.root = layers[0][0]
+    return dag
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_observe_utility_paths_agree(monkeypatch, seed):
+    regmins = {}
+    for have_numba in (True, False):
+        monkeypatch.setattr(team_belief_dag, "HAVE_NUMBA", have_numba)
+        dag = random_merging_dag(seed)
+        regmin = DagRegMin(dag)
+        rng = np.random.default_rng(seed)
+        for _ in range(5):
+            regmin.next_strategy()
+            regmin.observe_utility(rng.standard_normal(len(dag.edges)))
+        regmins[have_numba] = regmin
+
+    np.testing.assert_allclose(regmins[True].regret, regmins[False].regret)
+    np.testing.assert_allclose(regmins[True].x_prime, regmins[False].x_prime)